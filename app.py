@@ -1,34 +1,123 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, g, render_template, stream_template, get_template_attribute, request, redirect, url_for, session, flash, get_flashed_messages, jsonify, send_file
 import feedparser
 import json
+import re
 import os
+import sqlite3
+import xml.etree.ElementTree as ET
 import time
+import random
+import hashlib
+import hmac
+import secrets
+import io
+import heapq
+import bisect
+import base64
+import binascii
+import threading
+import socket
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-from concurrent.futures import ThreadPoolExecutor
+from html import unescape as html_unescape
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+from requests.adapters import HTTPAdapter
+from PIL import Image, ImageOps
+from collections import Counter, OrderedDict, namedtuple
+from itertools import dropwhile, islice
+from contextlib import contextmanager
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeout
+try: import fcntl
+except ImportError: fcntl = None
+try: import msvcrt
+except ImportError: msvcrt = None
 
 app = Flask(__name__)
 app.secret_key = 'secure_key_change_this'
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, 'data')
+DATA_DIR = os.environ.get('RSSCONNECT_DATA_DIR', os.path.join(BASE_DIR, 'data'))
 DATA_FILE = os.path.join(DATA_DIR, 'user_data.json')
+DB_FILE = os.environ.get('RSSCONNECT_DB', os.path.join(DATA_DIR, 'rssconnect.db'))
+SNAPSHOT_DIR = os.path.join(DATA_DIR, 'snapshots')
+THUMB_DIR = os.path.join(DATA_DIR, 'thumbs')
+REFRESH_LOCK_FILE = os.path.join(DATA_DIR, 'refresher.lock')
 
-if not os.path.exists(DATA_DIR):
-    os.makedirs(DATA_DIR)
+for d in (DATA_DIR, SNAPSHOT_DIR, THUMB_DIR):
+    if not os.path.exists(d): os.makedirs(d)
 
 # --- Constants ---
 LIMIT_CATEGORIES = 50
 LIMIT_FEEDS_PER_CAT = 30
 FINDER_RESULT_LIMIT = 20
+FEED_TYPES = ('application/rss+xml', 'application/atom+xml', 'application/rdf+xml')
+FEED_ROOT_RE = re.compile(r'<(rss|feed|rdf:RDF)[\s>]', re.I)
+FEED_SNIFF_BYTES = 2048
+DISCOVERY_HEAD_BYTES = 256 * 1024
+DISCOVERY_PROBES = ['/feed', '/feed/', '/rss', '/rss.xml', '/feed.xml', '/atom.xml', '/index.xml', '/?feed=rss2', '/blog/feed']
+DISCOVERY_DEADLINE = 8
+DISCOVERY_CACHE_TTL = 6 * 3600
+DISCOVERY_CACHE_MAX = 512
+OPML_DEFAULT_CATEGORY = 'Imported'
+OPML_VALIDATE_CONCURRENCY = 16
+OPML_IMPORT_STALLED = 120
+OPML_IMPORT_RETENTION = 86400
+SEARCH_RESULT_LIMIT = 50
+ARTICLE_RETENTION_DAYS = int(os.environ.get('ARTICLE_RETENTION_DAYS', 30))
+FEED_ENTRY_LIMIT = 12
+SUMMARY_LENGTH = 150
+TIMELINE_PAGE_SIZE = 24
+NORMALIZE_CACHE_MAX = 4096
+FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', 300))
+FEED_CACHE_MAX = int(os.environ.get('FEED_CACHE_MAX', 256))
+PLACEHOLDER_IMG = 'placeholder.svg'
+LEGACY_PLACEHOLDER_IMG = 'https://picsum.photos/400/225'
+THUMB_WIDTH, THUMB_HEIGHT = 400, 225
+THUMB_QUALITY = 75
+THUMB_MAX_BYTES = 10 * 1024 * 1024
+THUMB_MAX_PIXELS = 40_000_000
+THUMB_CACHE_MAX_BYTES = int(os.environ.get('THUMB_CACHE_MAX_MB', 256)) * 1024 * 1024
+THUMB_MAX_AGE = 365 * 86400
+THUMB_FAIL_TTL = 3600
+THUMB_FAIL_MAX = 4096
+
+# Background refresh (seconds). Set FEED_REFRESHER=0 to fetch on the request path instead.
+# Without a file lock every process would think it is the refresher, so it is disabled then.
+REFRESHER_ENABLED = os.environ.get('FEED_REFRESHER', '1') != '0' and (fcntl or msvcrt) is not None
+REFRESH_WORKERS = 8
+REFRESH_DEFAULT_INTERVAL = int(os.environ.get('REFRESH_DEFAULT_INTERVAL', 600))
+REFRESH_MIN_INTERVAL = int(os.environ.get('REFRESH_MIN_INTERVAL', 120))
+REFRESH_MAX_INTERVAL = int(os.environ.get('REFRESH_MAX_INTERVAL', 3600))
+REFRESH_JITTER = 0.1
+REFRESH_SYNC_INTERVAL = 60
+REFRESH_LOCK_RETRY = 30
+
+# Upstream fetching (seconds / bytes). CATEGORY_DEADLINE bounds how long a page waits for cold feeds.
+USER_AGENT = 'RSSConnect/1.0 (+https://github.com/ZPelletierCSUSTAN/RSSConnect)'
+FETCH_WORKERS = 32
+FETCH_PER_HOST = 6
+FETCH_CONNECT_TIMEOUT = 3.05
+FETCH_READ_TIMEOUT = 10
+FETCH_TOTAL_TIMEOUT = 15
+FETCH_MAX_BYTES = 5 * 1024 * 1024
+CATEGORY_DEADLINE = float(os.environ.get('CATEGORY_DEADLINE', 4))
+
+# Circuit breaker for failing feeds (seconds) and metric histogram buckets.
+BREAKER_THRESHOLD = 3
+BREAKER_BASE_BACKOFF = 300
+BREAKER_MAX_BACKOFF = 6 * 3600
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
 
 DEFAULT_CATEGORIES = [
     'World News', 'TV & Movies', 'Comics', 
     'Music', 'Video Games', 'Tech', 'Food', 'Other'
 ]
 
+DEFAULT_FAV_CATEGORIES = ['Read Later']
+
 DEFAULT_FEEDS = [
     {'id': 'wn1', 'name': 'CNN', 'url': 'https://www.youtube.com/feeds/videos.xml?channel_id=UCupvZG-5ko_eiXAupbDfxWw', 'category': 'World News'},
     {'id': 'wn2', 'name': 'BBC News', 'url': 'https://www.youtube.com/feeds/videos.xml?channel_id=UC16niRr50-MSBwiO3YDb3RA', 'category': 'World News'},
@@ -63,81 +152,1158 @@ DEFAULT_FEEDS = [
     {'id': 'ot3', 'name': 'Insider Tech', 'url': 'https://www.youtube.com/feeds/videos.xml?channel_id=UCJXxuESjGIaaqb1-IRWFihw', 'category': 'Other'},
 ]
 
-# --- Helpers ---
-def get_all_data():
-    if not os.path.exists(DATA_FILE): return {}
+# --- Metrics ---
+class Metrics:
+    """Minimal in-process metrics registry rendered in the Prometheus text format.
+
+    Values are per process; under gunicorn scrape each worker or run a single one.
+    """
+    def __init__(self, definitions):
+        self.definitions = definitions
+        self._values = {name: {} for name in definitions}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock: self._values[name][key] = self._values[name].get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock: self._values[name][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            hist = self._values[name].setdefault(key, [[0] * len(LATENCY_BUCKETS), 0.0, 0])
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound: hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def render(self):
+        fmt = lambda labels: '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels) + '}' if labels else ''
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in self.definitions.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for labels, value in sorted(self._values[name].items()):
+                    if kind != 'histogram':
+                        lines.append(f"{name}{fmt(labels)} {value}")
+                        continue
+                    for bound, count in zip(LATENCY_BUCKETS, value[0]):
+                        lines.append(f"{name}_bucket{fmt(labels + (('le', bound),))} {count}")
+                    lines += [f"{name}_bucket{fmt(labels + (('le', '+Inf'),))} {value[2]}", f"{name}_sum{fmt(labels)} {value[1]}", f"{name}_count{fmt(labels)} {value[2]}"]
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics({
+    'rssconnect_request_duration_seconds': ('histogram', 'Time to serve a request (including streamed bodies), by endpoint.'),
+    'rssconnect_store_duration_seconds': ('histogram', 'Time spent in user store operations, by operation.'),
+    'rssconnect_feed_fetches_total': ('counter', 'Upstream feed fetches by result (updated, not_modified, failed, open).'),
+    'rssconnect_feed_errors_total': ('counter', 'Failed feed fetches by error class.'),
+    'rssconnect_feed_bytes_total': ('counter', 'Response bytes downloaded per feed.'),
+    'rssconnect_feed_headers_seconds': ('gauge', 'Time to response headers (DNS, connect, TLS and server wait) of the last fetch.'),
+    'rssconnect_feed_transfer_seconds': ('gauge', 'Body transfer time of the last fetch.'),
+    'rssconnect_feed_parse_seconds': ('gauge', 'Parse and normalization time of the last fetch.'),
+    'rssconnect_feed_entries': ('gauge', 'Entries in the last parsed response.'),
+    'rssconnect_feed_http_status': ('gauge', 'HTTP status of the last fetch (0 if no response).'),
+    'rssconnect_feed_consecutive_failures': ('gauge', 'Consecutive failed fetches; the circuit opens at BREAKER_THRESHOLD.'),
+    'rssconnect_feed_cache_entries': ('gauge', 'Feeds held in the in-process feed cache.'),
+    'rssconnect_thumb_requests_total': ('counter', 'Thumbnail requests by result (hit, miss, failed).'),
+    'rssconnect_thumb_cache_bytes': ('gauge', 'Bytes held in the on-disk thumbnail cache, as last measured by this process.'),
+})
+
+def timed_store(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try: return fn(*args, **kwargs)
+        finally: metrics.observe('rssconnect_store_duration_seconds', time.perf_counter() - started, op=fn.__name__)
+    return wrapper
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.teardown_request
+def record_request(exc=None):
+    # Teardown runs after a streamed body is fully sent, so streamed pages are timed end to end.
+    if 'request_started' in g:
+        metrics.observe('rssconnect_request_duration_seconds', time.perf_counter() - g.request_started, endpoint=request.endpoint or 'unknown')
+
+# --- Storage ---
+_db_local = threading.local()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS categories (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    name TEXT NOT NULL, position INTEGER NOT NULL, PRIMARY KEY (user_id, name));
+CREATE TABLE IF NOT EXISTS feeds (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    feed_id TEXT NOT NULL, name TEXT, url TEXT NOT NULL, category TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_feeds_category ON feeds(user_id, category);
+CREATE INDEX IF NOT EXISTS idx_feeds_url ON feeds(url);
+CREATE TABLE IF NOT EXISTS fav_categories (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    name TEXT NOT NULL, position INTEGER NOT NULL, PRIMARY KEY (user_id, name));
+CREATE TABLE IF NOT EXISTS favorites (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    title TEXT, link TEXT NOT NULL, thumbnail TEXT, source TEXT, timestamp REAL, fav_category TEXT,
+    UNIQUE (user_id, link));
+CREATE INDEX IF NOT EXISTS idx_favorites_link ON favorites(link);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS feed_health (
+    url TEXT PRIMARY KEY, failures INTEGER NOT NULL DEFAULT 0, open_until REAL,
+    last_error TEXT, last_status INTEGER, checked_at REAL, last_success REAL);
+CREATE TABLE IF NOT EXISTS opml_imports (
+    id TEXT PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    done INTEGER NOT NULL DEFAULT 0, finished INTEGER NOT NULL DEFAULT 0, result TEXT NOT NULL,
+    created_at REAL NOT NULL, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY, link TEXT NOT NULL UNIQUE, title TEXT, summary TEXT, thumbnail TEXT,
+    published TEXT, timestamp REAL NOT NULL, indexed_at REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_articles_timestamp ON articles(timestamp);
+CREATE TABLE IF NOT EXISTS article_sources (
+    article_id INTEGER NOT NULL REFERENCES articles(id) ON DELETE CASCADE,
+    feed_url TEXT NOT NULL, PRIMARY KEY (article_id, feed_url)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_article_sources_url ON article_sources(feed_url);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(title, summary, content='articles', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, summary) VALUES (new.id, new.title, new.summary); END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, summary) VALUES ('delete', old.id, old.title, old.summary); END;
+CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, summary) VALUES ('delete', old.id, old.title, old.summary);
+    INSERT INTO articles_fts (rowid, title, summary) VALUES (new.id, new.title, new.summary); END;
+"""
+
+def get_db():
+    # One connection per thread; WAL lets gunicorn workers read while another writes.
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        _db_local.conn = conn
+    return conn
+
+@contextmanager
+def transaction():
+    conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try: yield conn
+    except:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+def _user_id(conn, username, create=True):
+    row = conn.execute('SELECT id FROM users WHERE name = ?', (username,)).fetchone()
+    if row: return row['id']
+    return _insert_user(conn, username, {}) if create else None
+
+def _append(conn, table, user_id, name):
+    conn.execute(f'INSERT OR IGNORE INTO {table} (user_id, name, position) VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM {table} WHERE user_id = ?))', (user_id, name, user_id))
+
+def _insert_user(conn, username, data):
+    user_id = conn.execute('INSERT INTO users (name) VALUES (?)', (username,)).lastrowid
+    conn.executemany('INSERT OR IGNORE INTO categories (user_id, name, position) VALUES (?, ?, ?)', [(user_id, c, i) for i, c in enumerate(data.get('categories', DEFAULT_CATEGORIES))])
+    conn.executemany('INSERT INTO feeds (user_id, feed_id, name, url, category) VALUES (?, ?, ?, ?, ?)', [(user_id, f.get('id', ''), f.get('name'), f['url'], f.get('category', '')) for f in data.get('feeds', DEFAULT_FEEDS) if f.get('url')])
+    conn.executemany('INSERT OR IGNORE INTO fav_categories (user_id, name, position) VALUES (?, ?, ?)', [(user_id, c, i) for i, c in enumerate(data.get('fav_categories', DEFAULT_FAV_CATEGORIES))])
+    # Favorites are listed newest first, so insert oldest first to keep id order.
+    conn.executemany('INSERT OR IGNORE INTO favorites (user_id, title, link, thumbnail, source, timestamp, fav_category) VALUES (?, ?, ?, ?, ?, ?, ?)', [(user_id, f.get('title'), f['link'], f.get('thumbnail'), f.get('source'), f.get('timestamp'), f.get('fav_category')) for f in reversed(data.get('favorites', [])) if f.get('link')])
+    return user_id
+
+def migrate_json(path=DATA_FILE):
+    """One-shot import of the legacy user_data.json store. Returns the number of users imported."""
+    with transaction() as conn:
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone(): return 0
+        data = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                content = f.read().strip()
+                data = json.loads(content) if content else {}
+        imported = 0
+        for username, user_data in data.items():
+            if conn.execute('SELECT 1 FROM users WHERE name = ?', (username,)).fetchone(): continue
+            _insert_user(conn, username, user_data)
+            imported += 1
+        conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (str(time.time()),))
+    return imported
+
+def init_db():
+    get_db().executescript(SCHEMA)
+    try: migrate_json()
+    except (OSError, ValueError): app.logger.exception("Could not migrate %s", DATA_FILE)
+
+@timed_store
+def get_secret(name):
+    """Return the per-deployment secret `name`, generated once and kept in the meta table."""
+    with transaction() as conn:
+        conn.execute('INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)', (name, secrets.token_hex(32)))
+        return conn.execute('SELECT value FROM meta WHERE key = ?', (name,)).fetchone()['value']
+
+@timed_store
+def list_users():
+    return [r['name'] for r in get_db().execute('SELECT name FROM users ORDER BY id')]
+
+@timed_store
+def user_exists(username):
+    return get_db().execute('SELECT 1 FROM users WHERE name = ?', (username,)).fetchone() is not None
+
+@timed_store
+def create_user(username):
+    with transaction() as conn:
+        if _user_id(conn, username, create=False) is not None: return False
+        _insert_user(conn, username, {})
+    return True
+
+@timed_store
+def delete_user(username):
+    with transaction() as conn: conn.execute('DELETE FROM users WHERE name = ?', (username,))
+
+@timed_store
+def all_feed_urls():
+    return {r['url'] for r in get_db().execute('SELECT DISTINCT url FROM feeds')}
+
+@timed_store
+def get_feeds(username, category=None):
+    sql = 'SELECT f.feed_id, f.name, f.url, f.category FROM feeds f JOIN users u ON u.id = f.user_id WHERE u.name = ?'
+    args = (username,)
+    if category is not None: sql, args = sql + ' AND f.category = ?', args + (category,)
+    return [{'id': r['feed_id'], 'name': r['name'], 'url': r['url'], 'category': r['category']} for r in get_db().execute(sql + ' ORDER BY f.id', args)]
+
+@timed_store
+def get_fav_categories(username):
+    return [r['name'] for r in get_db().execute('SELECT c.name FROM fav_categories c JOIN users u ON u.id = c.user_id WHERE u.name = ? ORDER BY c.position', (username,))]
+
+@timed_store
+def get_user_config(username):
+    conn = get_db()
+    if not user_exists(username):
+        return {'categories': list(DEFAULT_CATEGORIES), 'feeds': list(DEFAULT_FEEDS), 'fav_categories': list(DEFAULT_FAV_CATEGORIES), 'favorites': []}
+    categories = [r['name'] for r in conn.execute('SELECT c.name FROM categories c JOIN users u ON u.id = c.user_id WHERE u.name = ? ORDER BY c.position', (username,))]
+    favorites = [dict(r) for r in conn.execute('SELECT f.title, f.link, f.thumbnail, f.source, f.timestamp, f.fav_category FROM favorites f JOIN users u ON u.id = f.user_id WHERE u.name = ? ORDER BY f.id DESC', (username,))]
+    return {'categories': categories, 'feeds': get_feeds(username), 'fav_categories': get_fav_categories(username), 'favorites': favorites}
+
+@timed_store
+def add_category(username, name):
+    with transaction() as conn:
+        user_id = _user_id(conn, username)
+        if conn.execute('SELECT COUNT(*) FROM categories WHERE user_id = ?', (user_id,)).fetchone()[0] >= LIMIT_CATEGORIES: return False
+        _append(conn, 'categories', user_id, name)
+    return True
+
+@timed_store
+def delete_category(username, name):
+    with transaction() as conn: conn.execute('DELETE FROM categories WHERE user_id = ? AND name = ?', (_user_id(conn, username), name))
+
+@timed_store
+def add_feed(username, name, url, category):
+    with transaction() as conn:
+        user_id = _user_id(conn, username)
+        if conn.execute('SELECT COUNT(*) FROM feeds WHERE user_id = ? AND category = ?', (user_id, category)).fetchone()[0] >= LIMIT_FEEDS_PER_CAT: return False
+        conn.execute('INSERT INTO feeds (user_id, feed_id, name, url, category) VALUES (?, ?, ?, ?, ?)', (user_id, str(int(time.time())), name, url, category))
+    return True
+
+@timed_store
+def import_feeds(username, feeds):
+    """Add `(category, name, url)` feeds in one transaction, skipping URLs the user already has and
+    creating categories as needed within LIMIT_CATEGORIES / LIMIT_FEEDS_PER_CAT. Returns `(added, skipped)`."""
+    with transaction() as conn:
+        user_id = _user_id(conn, username)
+        categories = {r['name'] for r in conn.execute('SELECT name FROM categories WHERE user_id = ?', (user_id,))}
+        rows = conn.execute('SELECT url, category FROM feeds WHERE user_id = ?', (user_id,)).fetchall()
+        urls, counts = {r['url'] for r in rows}, Counter(r['category'] for r in rows)
+        stamp, added = int(time.time()), []
+        for category, name, url in feeds:
+            if url in urls or counts[category] >= LIMIT_FEEDS_PER_CAT: continue
+            if category not in categories:
+                if len(categories) >= LIMIT_CATEGORIES: continue
+                _append(conn, 'categories', user_id, category)
+                categories.add(category)
+            urls.add(url)
+            counts[category] += 1
+            added.append((user_id, f"{stamp}-{len(added)}", name, url, category))
+        conn.executemany('INSERT INTO feeds (user_id, feed_id, name, url, category) VALUES (?, ?, ?, ?, ?)', added)
+    return len(added), len(feeds) - len(added)
+
+@timed_store
+def create_import(username, result):
+    """Record a new OPML import job and return its id; jobs older than OPML_IMPORT_RETENTION are dropped."""
+    job_id, now = secrets.token_urlsafe(12), time.time()
+    with transaction() as conn:
+        conn.execute('DELETE FROM opml_imports WHERE created_at < ?', (now - OPML_IMPORT_RETENTION,))
+        conn.execute('INSERT INTO opml_imports (id, user_id, result, created_at, updated_at) VALUES (?, ?, ?, ?, ?)', (job_id, _user_id(conn, username), json.dumps(result), now, now))
+    return job_id
+
+@timed_store
+def update_import(job_id, done, result=None):
+    # `result` is only written once the job has finished.
+    with transaction() as conn:
+        if result is None: conn.execute('UPDATE opml_imports SET done = ?, updated_at = ? WHERE id = ?', (done, time.time(), job_id))
+        else: conn.execute('UPDATE opml_imports SET done = ?, finished = 1, result = ?, updated_at = ? WHERE id = ?', (done, json.dumps(result), time.time(), job_id))
+
+@timed_store
+def get_import(username, job_id):
+    row = get_db().execute('SELECT i.done, i.finished, i.result, i.updated_at FROM opml_imports i JOIN users u ON u.id = i.user_id WHERE i.id = ? AND u.name = ?', (job_id, username)).fetchone()
+    if row is None: return None
+    job = {'done': row['done'], 'finished': bool(row['finished']), 'result': json.loads(row['result'])}
+    # A job whose worker died (e.g. a restart) stops updating; report it rather than poll forever.
+    job['stalled'] = not job['finished'] and time.time() - row['updated_at'] > OPML_IMPORT_STALLED
+    return job
+
+@timed_store
+def delete_feeds(username, feed_id=None, category=None):
+    # With neither filter every feed of the user is removed.
+    sql, args = 'DELETE FROM feeds WHERE user_id = ?', []
+    if feed_id is not None: sql, args = sql + ' AND feed_id = ?', [feed_id]
+    if category is not None: sql, args = sql + ' AND category = ?', args + [category]
+    with transaction() as conn: conn.execute(sql, [_user_id(conn, username)] + args)
+
+@timed_store
+def add_fav_category(username, name):
+    with transaction() as conn: _append(conn, 'fav_categories', _user_id(conn, username), name)
+
+@timed_store
+def delete_fav_category(username, name):
+    with transaction() as conn:
+        user_id = _user_id(conn, username)
+        conn.execute('DELETE FROM fav_categories WHERE user_id = ? AND name = ?', (user_id, name))
+        conn.execute('DELETE FROM favorites WHERE user_id = ? AND fav_category = ?', (user_id, name))
+
+@timed_store
+def add_favorite(username, fav):
+    with transaction() as conn:
+        cur = conn.execute('INSERT OR IGNORE INTO favorites (user_id, title, link, thumbnail, source, timestamp, fav_category) VALUES (?, ?, ?, ?, ?, ?, ?)', (_user_id(conn, username), fav['title'], fav['link'], fav['thumbnail'], fav['source'], fav['timestamp'], fav['fav_category']))
+    return cur.rowcount > 0
+
+@timed_store
+def delete_favorite(username, link):
+    with transaction() as conn: conn.execute('DELETE FROM favorites WHERE user_id = ? AND link = ?', (_user_id(conn, username), link))
+
+init_db()
+
+# --- Fetch Engine ---
+FetchResult = namedtuple('FetchResult', 'status headers content url headers_seconds transfer_seconds', defaults=(0.0, 0.0))
+
+class FetchError(Exception):
+    pass
+
+class KeyedLocks:
+    """Per-key locks (or semaphores, via `factory`) for `with locks(key):`.
+
+    An entry only exists while some thread holds or waits on it, so keying by feed URL,
+    image URL or host stays bounded however many distinct keys a process sees.
+    """
+    def __init__(self, factory=threading.Lock):
+        self.factory = factory
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @contextmanager
+    def __call__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None: entry = self._entries[key] = [self.factory(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]: yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]: del self._entries[key]
+
+class FetchEngine:
+    """Long-lived HTTP client shared by every upstream request.
+
+    Connections are pooled and kept alive per host (one TLS handshake per host
+    rather than per feed), each host gets at most FETCH_PER_HOST concurrent
+    requests, and every response is bounded by FETCH_TOTAL_TIMEOUT and
+    FETCH_MAX_BYTES.
+    """
+    def __init__(self, workers=FETCH_WORKERS, per_host=FETCH_PER_HOST):
+        self.per_host = per_host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=100, pool_maxsize=per_host)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip, deflate'})
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fetch')
+        self._host_slots = KeyedLocks(lambda: threading.BoundedSemaphore(self.per_host))
+
+    def _slot(self, url):
+        return self._host_slots(urlsplit(url).netloc.lower())
+
+    def get(self, url, headers=None, max_bytes=FETCH_MAX_BYTES, timeout=FETCH_TOTAL_TIMEOUT, truncate=False, until=None):
+        """GET `url` and return a FetchResult; raises FetchError or requests.RequestException.
+
+        With `truncate`, reading stops quietly at `max_bytes` (or once the `until` marker has
+        been read, case-insensitively) and the prefix read so far is returned.
+        """
+        with self._slot(url):
+            started = time.monotonic()
+            with self.session.get(url, headers=headers, stream=True, timeout=(FETCH_CONNECT_TIMEOUT, min(FETCH_READ_TIMEOUT, timeout))) as r:
+                # A read blocks until a whole chunk arrives, so an upstream dripping a byte at a time
+                # never hits the read timeout; a watchdog cuts the connection once the budget is spent.
+                timed_out = threading.Event()
+                watchdog = threading.Timer(max(0, timeout - (time.monotonic() - started)), self._abort, (r, timed_out))
+                watchdog.daemon = True
+                watchdog.start()
+                chunks, size = [], 0
+                try:
+                    for chunk in r.iter_content(min(16384 if until else 65536, max_bytes)):
+                        size += len(chunk)
+                        if size > max_bytes:
+                            if not truncate: raise FetchError(f"{url} exceeds {max_bytes} bytes")
+                            chunks.append(chunk[:len(chunk) - (size - max_bytes)])
+                            break
+                        chunks.append(chunk)
+                        if until and until in b''.join(chunks[-2:]).lower(): break
+                except requests.RequestException:
+                    if not timed_out.is_set(): raise
+                finally: watchdog.cancel()
+                if timed_out.is_set(): raise FetchError(f"{url} took longer than {timeout}s")
+                headers_seconds = r.elapsed.total_seconds()
+                return FetchResult(r.status_code, r.headers, b''.join(chunks), r.url, headers_seconds, max(0.0, time.monotonic() - started - headers_seconds))
+
+    @staticmethod
+    def _abort(r, timed_out):
+        # shutdown() wakes a thread blocked in recv(); close() alone would not.
+        timed_out.set()
+        sock = getattr(r.raw.connection, 'sock', None)
+        try:
+            if sock is not None: sock.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+
+    def iter_until(self, fn, items, deadline):
+        """Run `fn` over `items` on the shared pool and yield results as they complete. Stops
+        after `deadline` seconds; anything still running finishes in the background and warms the cache."""
+        futures = [self.executor.submit(fn, item) for item in items]
+        try:
+            for f in as_completed(futures, timeout=deadline):
+                if not f.exception(): yield f.result()
+        except FuturesTimeout: pass
+
+    def imap_bounded(self, fn, items, limit):
+        """Yield `(item, result)` as `fn` finishes over `items`, with at most `limit` calls in
+        flight on the shared pool. A call that raises yields a None result."""
+        items, running = iter(items), {}
+        while True:
+            for item in items:
+                running[self.executor.submit(fn, item)] = item
+                if len(running) >= limit: break
+            if not running: return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in done: yield running.pop(f), None if f.exception() else f.result()
+
+fetch_engine = FetchEngine()
+
+# --- Entry Normalization ---
+Article = namedtuple('Article', 'title link thumbnail summary published timestamp source', defaults=('',))
+
+class SnippetParser(HTMLParser):
+    """Single streaming pass over entry HTML that records the first <img> src and the
+    first SUMMARY_LENGTH characters of visible text, then stops."""
+    SKIP = {'script', 'style', 'noscript'}
+
+    def __init__(self, want_img=True, want_text=True):
+        super().__init__(convert_charrefs=True)
+        self.img = None if want_img else False
+        self.text = [] if want_text else None
+        self.length = 0
+        self.skipping = 0
+
+    @property
+    def done(self):
+        return self.img is not None and (self.text is None or self.length >= SUMMARY_LENGTH)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP: self.skipping += 1
+        elif tag == 'img' and self.img is None:
+            src = dict(attrs).get('src')
+            if src: self.img = src
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.skipping: self.skipping -= 1
+
+    def handle_data(self, data):
+        if self.text is not None and not self.skipping and self.length < SUMMARY_LENGTH:
+            self.text.append(data)
+            self.length += len(data)
+
+def scan_html(html, want_img=True, want_text=True):
+    """Return `(first_img_src, text_prefix)` for `html`, feeding it in chunks until both are found."""
+    parser = SnippetParser(want_img, want_text)
+    for i in range(0, len(html), 1024):
+        parser.feed(html[i:i + 1024])
+        if parser.done: break
+    else: parser.close()  # flush text held back after a trailing '&' (e.g. "AT&T")
+    return parser.img or None, ''.join(parser.text or [])[:SUMMARY_LENGTH]
+
+def normalize_entry(entry):
+    img = None
+    if 'media_thumbnail' in entry: img = entry.media_thumbnail[0]['url']
+    elif 'media_content' in entry:
+        for m in entry.media_content:
+            if 'image' in m.get('medium', '') or 'image' in m.get('type', ''):
+                img = m['url']
+                break
+    content_html = entry.get('content', [{}])[0].get('value', '')
+    summary = entry.get('summary', '') or content_html
+    img_html = content_html or summary
+    clean_summary = ""
     try:
-        with open(DATA_FILE, 'r') as f:
-            content = f.read().strip()
-            return json.loads(content) if content else {}
-    except: return {}
+        # The fallback image and the snippet usually come from the same HTML, so scan it once.
+        if img is None and img_html == summary: img, clean_summary = scan_html(summary)
+        else:
+            if img is None and img_html: img, _ = scan_html(img_html, want_text=False)
+            if summary: _, clean_summary = scan_html(summary, want_img=False)
+        if summary: clean_summary += "..."
+    except Exception: clean_summary = "Click to read more..."
+
+    ts = time.time()
+    if hasattr(entry, 'published_parsed') and entry.published_parsed:
+        ts = time.mktime(entry.published_parsed)
+    return Article(entry.get('title', ''), entry.get('link', ''), img or '', clean_summary, entry.get('published', 'Recent'), ts)
+
+def entry_key(entry):
+    # Identity plus a hash of every field normalize_entry reads, so edited entries are re-processed.
+    parts = (entry.get('title', ''), entry.get('link', ''), entry.get('published', ''), entry.get('summary', ''),
+             entry.get('content', [{}])[0].get('value', ''), repr(entry.get('media_thumbnail')), repr(entry.get('media_content')))
+    digest = hashlib.sha1('\0'.join(parts).encode('utf-8', 'replace')).digest()
+    return (entry.get('id') or entry.get('link', ''), digest)
+
+_normalized = OrderedDict()
+_normalized_lock = threading.Lock()
+
+def parse_entries(parsed):
+    articles = []
+    for entry in parsed.entries[:FEED_ENTRY_LIMIT]:
+        key = entry_key(entry)
+        with _normalized_lock:
+            article = _normalized.get(key)
+            if article is not None: _normalized.move_to_end(key)
+        if article is None:
+            article = normalize_entry(entry)
+            with _normalized_lock:
+                _normalized[key] = article
+                while len(_normalized) > NORMALIZE_CACHE_MAX: _normalized.popitem(last=False)
+        articles.append(article)
+    return articles
+
+# --- Feed Health ---
+class FeedBreaker:
+    """Per-feed circuit breaker stored in the feed_health table so every worker shares it.
+
+    After BREAKER_THRESHOLD consecutive failures a feed is skipped until its retry
+    time, which doubles with each further failure up to BREAKER_MAX_BACKOFF; one
+    success closes the circuit again.
+    """
+    def allow(self, url):
+        row = get_db().execute('SELECT open_until FROM feed_health WHERE url = ?', (url,)).fetchone()
+        return row is None or not row['open_until'] or row['open_until'] <= time.time()
+
+    def record(self, url, error=None, status=None):
+        now = time.time()
+        with transaction() as conn:
+            row = conn.execute('SELECT failures FROM feed_health WHERE url = ?', (url,)).fetchone()
+            failures = (row['failures'] + 1 if row else 1) if error else 0
+            open_until = now + min(BREAKER_MAX_BACKOFF, BREAKER_BASE_BACKOFF * 2 ** (failures - BREAKER_THRESHOLD)) if failures >= BREAKER_THRESHOLD else None
+            conn.execute("""INSERT INTO feed_health (url, failures, open_until, last_error, last_status, checked_at, last_success) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET failures = excluded.failures, open_until = excluded.open_until, last_error = excluded.last_error,
+                last_status = excluded.last_status, checked_at = excluded.checked_at, last_success = COALESCE(excluded.last_success, last_success)""",
+                (url, failures, open_until, error, status, now, None if error else now))
+        metrics.set('rssconnect_feed_consecutive_failures', failures, feed=url)
+        return failures
+
+    def unhealthy(self, urls):
+        """Health rows for the feeds among `urls` whose circuit is open."""
+        urls = list(urls)
+        if not urls: return {}
+        rows = get_db().execute(f"SELECT * FROM feed_health WHERE failures >= ? AND url IN ({','.join('?' * len(urls))})", [BREAKER_THRESHOLD] + urls)
+        return {r['url']: dict(r) for r in rows}
+
+feed_breaker = FeedBreaker()
 
-def save_all_data(data):
+def record_fetch(url, result, resp=None, error=None, parse_seconds=None, entries=None):
+    metrics.inc('rssconnect_feed_fetches_total', feed=url, result=result)
+    if result == 'open': return
+    metrics.set('rssconnect_feed_http_status', resp.status if resp else 0, feed=url)
+    if resp:
+        metrics.inc('rssconnect_feed_bytes_total', len(resp.content), feed=url)
+        metrics.set('rssconnect_feed_headers_seconds', resp.headers_seconds, feed=url)
+        metrics.set('rssconnect_feed_transfer_seconds', resp.transfer_seconds, feed=url)
+    if parse_seconds is not None: metrics.set('rssconnect_feed_parse_seconds', parse_seconds, feed=url)
+    if entries is not None: metrics.set('rssconnect_feed_entries', entries, feed=url)
+    if error: metrics.inc('rssconnect_feed_errors_total', feed=url, error=error)
+    try: feed_breaker.record(url, error, resp.status if resp else None)
+    except sqlite3.Error: app.logger.exception("Could not record health of %s", url)
+
+# --- Feed Cache ---
+class FeedCache:
+    """Process-wide LRU cache of parsed feeds keyed by URL.
+
+    Each entry keeps the parsed article list (without the per-user source name)
+    plus the ETag/Last-Modified validators used to revalidate it once stale.
+    """
+    def __init__(self, max_size=FEED_CACHE_MAX, ttl=FEED_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        # One fetch per URL at a time so concurrent page views share a single upstream request.
+        self.lock_for = KeyedLocks()
+
+    def get(self, url):
+        with self._lock:
+            entry = self._items.get(url)
+            if entry is not None: self._items.move_to_end(url)
+            return entry
+
+    def put(self, url, articles, etag=None, modified=None, fetched_at=None):
+        entry = {'articles': articles, 'etag': etag, 'modified': modified, 'fetched_at': fetched_at or time.time()}
+        with self._lock:
+            self._items[url] = entry
+            self._items.move_to_end(url)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return entry
+
+    def __len__(self):
+        return len(self._items)
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry['fetched_at'] < self.ttl
+
+    def clear(self):
+        with self._lock: self._items.clear()
+
+feed_cache = FeedCache()
+
+def snapshot_path(url):
+    return os.path.join(SNAPSHOT_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+def write_snapshot(url, entry):
+    # Snapshots on disk are shared by every worker process; write atomically.
+    path = snapshot_path(url)
+    tmp = f"{path}.{os.getpid()}.tmp"
     try:
-        with open(DATA_FILE, 'w') as f:
-            json.dump(data, f, indent=4)
-    except: pass
+        with open(tmp, 'w') as f:
+            json.dump({'url': url, 'articles': [a._asdict() for a in entry['articles']], 'etag': entry['etag'], 'modified': entry['modified'], 'fetched_at': entry['fetched_at']}, f)
+        os.replace(tmp, path)
+        entry['mtime'] = os.path.getmtime(path)
+    except OSError: pass
 
-def get_user_config(username):
-    all_data = get_all_data()
-    user_data = all_data.get(username, {
-        'categories': list(DEFAULT_CATEGORIES), 
-        'feeds': list(DEFAULT_FEEDS),
-        'fav_categories': ['Read Later', 'Best Of'],
-        'favorites': []
-    })
-    if 'categories' not in user_data: user_data['categories'] = list(DEFAULT_CATEGORIES)
-    if 'feeds' not in user_data: user_data['feeds'] = list(DEFAULT_FEEDS)
-    if 'favorites' not in user_data: user_data['favorites'] = []
-    if 'fav_categories' not in user_data: user_data['fav_categories'] = ['Read Later']
-    return user_data, all_data
+def load_snapshot(url):
+    """Return the newest known entry for `url`, reloading from disk if another process refreshed it."""
+    cached = feed_cache.get(url)
+    try: mtime = os.path.getmtime(snapshot_path(url))
+    except OSError: return cached
+    if cached is not None and cached.get('mtime', 0) >= mtime: return cached
+    try:
+        with open(snapshot_path(url)) as f: data = json.load(f)
+        articles = [Article(**a) for a in data['articles']]
+    except (OSError, ValueError, TypeError, KeyError): return cached
+    entry = feed_cache.put(url, articles, data.get('etag'), data.get('modified'), data['fetched_at'])
+    entry['mtime'] = mtime
+    return entry
+
+def refresh_feed(url, cached=None):
+    """Fetch `url` upstream, revalidating `cached` with a conditional GET when possible.
+
+    Returns `(entry, status)` where status is 'updated', 'not_modified', 'failed', or
+    'open' when the feed's circuit breaker skipped the fetch.
+    """
+    if not feed_breaker.allow(url):
+        record_fetch(url, 'open')
+        return cached, 'open'
+    headers = {}
+    if cached and cached['etag']: headers['If-None-Match'] = cached['etag']
+    if cached and cached['modified']: headers['If-Modified-Since'] = cached['modified']
+    resp = parse_seconds = entries = error = None
+    try:
+        resp = fetch_engine.get(url, headers=headers)
+        if cached and resp.status == 304:
+            entry, status = feed_cache.put(url, cached['articles'], cached['etag'], cached['modified']), 'not_modified'
+        elif resp.status >= 400: error = f"HTTP{resp.status}"
+        else:
+            started = time.perf_counter()
+            parsed = feedparser.parse(resp.content, response_headers={'content-type': resp.headers.get('Content-Type', ''), 'content-location': resp.url})
+            entries = len(parsed.entries)
+            # A well-formed feed with no items is a success; only an unparseable or unrecognised document fails.
+            if not parsed.entries and parsed.get('bozo'): error = type(parsed.get('bozo_exception')).__name__
+            elif not parsed.entries and not parsed.get('version'): error = 'NotAFeed'
+            else: entry, status = feed_cache.put(url, parse_entries(parsed), resp.headers.get('ETag'), resp.headers.get('Last-Modified')), 'updated'
+            parse_seconds = time.perf_counter() - started
+    except Exception as e: error = type(e).__name__
+    record_fetch(url, 'failed' if error else status, resp, error, parse_seconds, entries)
+    if error: return cached, 'failed'
+    write_snapshot(url, entry)
+    if status == 'updated':
+        try: index_articles(url, entry['articles'])
+        except sqlite3.Error: app.logger.exception("Could not index %s", url)
+    return entry, status
+
+def get_feed_articles(url):
+    # With the refresher running any snapshot is served as-is; only never-seen feeds are fetched inline.
+    cached = load_snapshot(url)
+    if cached is not None and (REFRESHER_ENABLED or feed_cache.is_fresh(cached)): return cached['articles']
+    with feed_cache.lock_for(url):
+        cached = feed_cache.get(url)
+        if not feed_cache.is_fresh(cached): cached, _ = refresh_feed(url, cached)
+    return cached['articles'] if cached else []
+
+def snapshot_updated_at(urls):
+    """Fetch time of the oldest snapshot among `urls`, or None if none are cached."""
+    times = [e['fetched_at'] for e in (load_snapshot(u) for u in urls) if e]
+    return min(times) if times else None
 
 def fetch_single_feed(feed):
     try:
-        parsed = feedparser.parse(feed['url'])
-        if not parsed.entries: return []
-        articles = []
-        for entry in parsed.entries[:12]:
-            img = 'https://picsum.photos/400/225'
-            if 'media_thumbnail' in entry: img = entry.media_thumbnail[0]['url']
-            elif 'media_content' in entry:
-                for m in entry.media_content:
-                    if 'image' in m.get('medium', '') or 'image' in m.get('type', ''):
-                        img = m['url']
-                        break
-            if img == 'https://picsum.photos/400/225':
-                content_html = entry.get('content', [{}])[0].get('value', '') or entry.get('summary', '')
-                if content_html:
-                    try:
-                        soup = BeautifulSoup(content_html, 'html.parser')
-                        img_tag = soup.find('img')
-                        if img_tag and img_tag.get('src'): img = img_tag['src']
-                    except: pass
-            
-            summary = entry.get('summary', '')
-            if not summary and 'content' in entry: summary = entry.content[0].get('value', '')
-            clean_summary = ""
-            if summary:
-                try:
-                    soup = BeautifulSoup(summary, 'html.parser')
-                    clean_summary = soup.get_text()[:150] + "..."
-                except: clean_summary = "Click to read more..."
+        return [a._replace(source=feed['name']) for a in get_feed_articles(feed['url'])]
+    except Exception:
+        app.logger.exception("Could not load feed %s", feed['url'])
+        return []
 
-            ts = time.time()
-            if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                ts = time.mktime(entry.published_parsed)
-            
-            articles.append({
-                'title': entry.title,
-                'link': entry.link,
-                'thumbnail': img,
-                'summary': clean_summary,
-                'source': feed['name'],
-                'published': entry.get('published', 'Recent'),
-                'timestamp': ts
-            })
-        return articles
-    except: return []
+# --- Timeline ---
+def timeline_key(article):
+    # Newest first, ties broken by link so the order (and cursors) are stable.
+    return (-article.timestamp, article.link)
+
+def encode_cursor(article):
+    return base64.urlsafe_b64encode(json.dumps([article.timestamp, article.link]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Turn an opaque cursor back into a timeline key; raises ValueError if it is malformed."""
+    try:
+        ts, link = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (-float(ts), str(link))
+    except (TypeError, binascii.Error, UnicodeError) as e: raise ValueError(f"Bad cursor: {cursor!r}") from e
+
+def merge_timeline(streams, after=None, limit=TIMELINE_PAGE_SIZE):
+    """k-way merge of per-feed article lists into one page of at most `limit` articles
+    strictly after the `after` key. Returns `(page, next_cursor)`."""
+    merged = heapq.merge(*(sorted(s, key=timeline_key) for s in streams), key=timeline_key)
+    if after is not None: merged = dropwhile(lambda a: timeline_key(a) <= after, merged)
+    page = list(islice(merged, limit + 1))
+    return page[:limit], encode_cursor(page[limit - 1]) if len(page) > limit else None
+
+def unique_feeds(feeds):
+    seen = set()
+    return [f for f in feeds if f['url'] not in seen and not seen.add(f['url'])]
+
+# --- Article Index ---
+_last_prune = 0
+
+def index_articles(feed_url, articles):
+    """Upsert a feed's articles into the search index, deduplicated by link."""
+    global _last_prune
+    if not articles: return
+    rows = [(a.link, a.title, a.summary, a.thumbnail, a.published, a.timestamp, time.time()) for a in articles if a.link]
+    with transaction() as conn:
+        conn.executemany("""INSERT INTO articles (link, title, summary, thumbnail, published, timestamp, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(link) DO UPDATE SET title = excluded.title, summary = excluded.summary, thumbnail = excluded.thumbnail, published = excluded.published
+            WHERE title IS NOT excluded.title OR summary IS NOT excluded.summary OR thumbnail IS NOT excluded.thumbnail""", rows)
+        conn.executemany('INSERT OR IGNORE INTO article_sources (article_id, feed_url) SELECT id, ? FROM articles WHERE link = ?', [(feed_url, r[0]) for r in rows])
+    if time.time() - _last_prune > 3600:
+        _last_prune = time.time()
+        prune_articles()
+
+def prune_articles(max_age_days=ARTICLE_RETENTION_DAYS):
+    with transaction() as conn:
+        return conn.execute('DELETE FROM articles WHERE timestamp < ?', (time.time() - max_age_days * 86400,)).rowcount
+
+def fts_query(text):
+    # Quote every term so user input can't hit FTS5 syntax; a trailing * makes each a prefix match.
+    terms = [t.replace('"', '""') for t in text.split()]
+    return ' '.join(f'"{t}"*' for t in terms if t)
+
+def search_articles(username, text, days=None, limit=SEARCH_RESULT_LIMIT):
+    """Ranked (bm25) articles from `username`'s feeds matching `text`, optionally only the last `days` days."""
+    match = fts_query(text)
+    if not match: return []
+    since = time.time() - days * 86400 if days else 0
+    rows = get_db().execute("""
+        SELECT a.title, a.link, a.thumbnail, a.summary, a.published, a.timestamp,
+               (SELECT f.name FROM article_sources s JOIN feeds f ON f.url = s.feed_url WHERE s.article_id = a.id AND f.user_id = u.id LIMIT 1) AS source
+        FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid JOIN users u ON u.name = ?
+        WHERE articles_fts MATCH ? AND a.timestamp >= ?
+          AND EXISTS (SELECT 1 FROM article_sources s JOIN feeds f ON f.url = s.feed_url WHERE s.article_id = a.id AND f.user_id = u.id)
+        ORDER BY bm25(articles_fts, 5.0, 1.0) LIMIT ?""", (username, match, since, limit))
+    return [Article(*r) for r in rows]
+
+# --- Feed Discovery ---
+class HeadParser(HTMLParser):
+    """Collects <link rel="alternate"> feed links from a page's <head>."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done: return
+        if tag == 'body': self.done = True
+        elif tag == 'link':
+            a = dict(attrs)
+            if 'alternate' in (a.get('rel') or '').lower().split() and (a.get('type') or '').lower() in FEED_TYPES and a.get('href'):
+                self.links.append((a.get('title') or 'RSS Feed', a['href']))
+
+    def handle_endtag(self, tag):
+        if tag == 'head': self.done = True
+
+def sniff_feed(url):
+    """Return `(url, title)` if the first bytes at `url` look like RSS/Atom, else None."""
+    try: resp = fetch_engine.get(url, max_bytes=FEED_SNIFF_BYTES, truncate=True)
+    except Exception: return None
+    if resp.status >= 400: return None
+    text = resp.content.decode('utf-8', 'replace')
+    if not FEED_ROOT_RE.search(text): return None
+    m = re.search(r'<title[^>]*>\s*(?:<!\[CDATA\[)?(.*?)(?:\]\]>)?\s*</title>', text, re.S | re.I)
+    return resp.url, html_unescape(m.group(1)).strip() if m else ''
+
+def fetch_head(url):
+    # Read only until </head>; the body never matters for discovery.
+    resp = fetch_engine.get(url, max_bytes=DISCOVERY_HEAD_BYTES, truncate=True, until=b'</head>')
+    return resp.url, resp.content.decode('utf-8', 'replace')
+
+def probe_urls(url):
+    parts = urlsplit(url)
+    root = f"{parts.scheme}://{parts.netloc}"
+    urls = [root + path for path in DISCOVERY_PROBES]
+    if parts.netloc.lower().endswith('youtube.com'):
+        query = dict(p.split('=', 1) for p in parts.query.split('&') if '=' in p)
+        m = re.match(r'/channel/(UC[\w-]+)', parts.path)
+        if m: urls.insert(0, f"https://www.youtube.com/feeds/videos.xml?channel_id={m.group(1)}")
+        if 'list' in query: urls.insert(0, f"https://www.youtube.com/feeds/videos.xml?playlist_id={query['list']}")
+    return urls
+
+_discovered = OrderedDict()
+_discovered_lock = threading.Lock()
+
+def discover_feeds(url):
+    """Find validated feeds for the site at `url`. Returns `(feeds, error)`.
+
+    The page's <head> is fetched while well-known feed paths are probed; every
+    candidate is then validated concurrently by sniffing its first bytes.
+    Lookups that found feeds with every check finished are cached per site for
+    DISCOVERY_CACHE_TTL seconds; empty or deadline-cut results are not.
+    """
+    parts = urlsplit(url)
+    key = parts.netloc.lower() + parts.path.rstrip('/') + (f"?{parts.query}" if parts.query else '')
+    with _discovered_lock:
+        hit = _discovered.get(key)
+        if hit and time.time() - hit[0] < DISCOVERY_CACHE_TTL:
+            _discovered.move_to_end(key)
+            return hit[1], None
+    deadline = time.monotonic() + DISCOVERY_DEADLINE
+    page = fetch_engine.executor.submit(fetch_head, url)
+    probes = [(None, u, fetch_engine.executor.submit(sniff_feed, u)) for u in probe_urls(url)]
+    try: page_url, head = page.result(timeout=max(0, deadline - time.monotonic()))
+    except Exception: return [], "Could not connect."
+
+    parser = HeadParser()
+    try: parser.feed(head)
+    except Exception: pass
+    declared = [(title, urljoin(page_url, href)) for title, href in parser.links]
+    if FEED_ROOT_RE.search(head[:FEED_SNIFF_BYTES]): declared.insert(0, (None, page_url))
+    checks = [(title, u, fetch_engine.executor.submit(sniff_feed, u)) for title, u in declared] + probes
+    wait([f for _, _, f in checks], timeout=max(0, deadline - time.monotonic()))
+
+    found, seen = [], set()
+    for title, candidate, future in checks:
+        result = future.result() if future.done() and not future.exception() else None
+        if not result or result[0] in seen: continue
+        seen.add(result[0])
+        found.append({'title': title or result[1] or 'RSS Feed', 'url': candidate if title else result[0]})
+    found = found[:FINDER_RESULT_LIMIT]
+    if found and all(f.done() for _, _, f in checks):
+        with _discovered_lock:
+            _discovered[key] = (time.time(), found)
+            while len(_discovered) > DISCOVERY_CACHE_MAX: _discovered.popitem(last=False)
+    return found, None if found else "No RSS feeds found."
+
+# --- OPML ---
+def parse_opml(stream):
+    """Stream-parse an OPML document into `(index, category, name, url)` tuples. Feeds take the
+    name of their innermost folder outline, or OPML_DEFAULT_CATEGORY outside any folder."""
+    feeds, folders = [], []
+    for event, el in ET.iterparse(stream, events=('start', 'end')):
+        if el.tag != 'outline': continue
+        if event == 'end':
+            folders.pop()
+            el.clear()
+            continue
+        url = (el.get('xmlUrl') or '').strip()
+        label = (el.get('title') or el.get('text') or '').strip()
+        if url:
+            category = next((f for f in reversed(folders) if f), OPML_DEFAULT_CATEGORY)
+            feeds.append((len(feeds), category, label or url, url))
+        folders.append(None if url else label)
+    return feeds
+
+def run_opml_import(job_id, username, todo, result):
+    """Validate `todo` feeds with bounded parallelism, recording progress, then add the valid ones in one transaction."""
+    valid, step = [], max(1, len(todo) // 100)
+    try:
+        for done, (feed, ok) in enumerate(fetch_engine.imap_bounded(lambda f: sniff_feed(f[3]), todo, OPML_VALIDATE_CONCURRENCY), 1):
+            (valid if ok else result['invalid']).append(feed)
+            if done % step == 0 and done < len(todo): update_import(job_id, done)
+        valid.sort()
+        result['invalid'].sort()
+        result['added'], result['skipped'] = import_feeds(username, [f[1:] for f in valid])
+    except Exception:
+        app.logger.exception("OPML import %s failed", job_id)
+        result['error'] = True
+    update_import(job_id, len(todo), result)
+
+def build_opml(username):
+    user_data = get_user_config(username)
+    root = ET.Element('opml', version='2.0')
+    head = ET.SubElement(root, 'head')
+    ET.SubElement(head, 'title').text = f"RSSConnect feeds for {username}"
+    ET.SubElement(head, 'dateCreated').text = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime())
+    body = ET.SubElement(root, 'body')
+    categories = list(user_data['categories']) + sorted({f['category'] for f in user_data['feeds']} - set(user_data['categories']))
+    for cat in categories:
+        feeds = [f for f in user_data['feeds'] if f['category'] == cat]
+        if not feeds: continue
+        folder = ET.SubElement(body, 'outline', text=cat, title=cat)
+        for f in feeds: ET.SubElement(folder, 'outline', type='rss', text=f['name'] or f['url'], title=f['name'] or f['url'], xmlUrl=f['url'])
+    return ET.tostring(root, encoding='utf-8', xml_declaration=True)
+
+# --- Thumbnails ---
+class ThumbCache:
+    """Size-bounded LRU cache of card-sized thumbnails on disk, shared by every worker process.
+
+    Files are named by the SHA-1 of the source image URL and a file's mtime is its
+    recency: hits bump it, and once the directory grows past `max_bytes` the least
+    recently served files are removed until it is back under 90% of the limit.
+    """
+    def __init__(self, directory=THUMB_DIR, max_bytes=THUMB_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._failed = OrderedDict()
+        self._lock = threading.Lock()
+        # One download per image at a time so a page full of cards never fetches the same original twice.
+        self.lock_for = KeyedLocks()
+
+    def path_for(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.webp')
+
+    def get(self, url):
+        path = self.path_for(url)
+        try: os.utime(path)
+        except OSError: return None
+        return path
+
+    def put(self, url, data):
+        path = self.path_for(url)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'wb') as f: f.write(data)
+            os.replace(tmp, path)
+        except OSError: return None
+        with self._lock:
+            self._failed.pop(url, None)
+            if self._size is not None: self._size += len(data)
+            if self._size is None or self._size > self.max_bytes: self._evict()
+        return path
+
+    def _evict(self):
+        # Re-measure from disk: other workers write here too, so the running total is only a hint.
+        files = []
+        for e in os.scandir(self.directory):
+            try: files.append((e.stat().st_mtime, e.stat().st_size, e.path))
+            except OSError: pass
+        self._size = sum(size for _, size, _ in files)
+        if self._size > self.max_bytes:
+            for _, size, path in sorted(files):
+                if self._size <= self.max_bytes * 0.9: break
+                try: os.remove(path)
+                except OSError: continue
+                self._size -= size
+        metrics.set('rssconnect_thumb_cache_bytes', self._size)
+
+    def failed_recently(self, url):
+        with self._lock:
+            failed_at = self._failed.get(url)
+            return failed_at is not None and time.time() - failed_at < THUMB_FAIL_TTL
+
+    def mark_failed(self, url):
+        with self._lock:
+            self._failed[url] = time.time()
+            self._failed.move_to_end(url)
+            while len(self._failed) > THUMB_FAIL_MAX: self._failed.popitem(last=False)
+
+thumb_cache = ThumbCache()
+
+def make_thumbnail(data):
+    """Downsize image bytes to cover a card (center-cropped like `object-fit: cover`, never
+    upscaled) and re-encode as WebP. Raises on anything Pillow cannot decode."""
+    img = Image.open(io.BytesIO(data))
+    if img.width * img.height > THUMB_MAX_PIXELS: raise ValueError(f"image is {img.width}x{img.height}")
+    # JPEGs can be decoded straight at 1/2..1/8 scale, which skips most of the work for large originals.
+    img.draft('RGB', (THUMB_WIDTH, THUMB_WIDTH))
+    img = ImageOps.exif_transpose(img)
+    img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info else 'RGB')
+    scale = min(1, img.width / THUMB_WIDTH, img.height / THUMB_HEIGHT)
+    img = ImageOps.fit(img, (max(1, round(THUMB_WIDTH * scale)), max(1, round(THUMB_HEIGHT * scale))), Image.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, 'WEBP', quality=THUMB_QUALITY, method=4)
+    return out.getvalue()
+
+def fetch_thumbnail(url):
+    """Return the cached thumbnail path for `url`, downloading and resizing it on first use, or None."""
+    with thumb_cache.lock_for(url):
+        path = thumb_cache.get(url)
+        if path: return path
+        if thumb_cache.failed_recently(url): return None
+        try:
+            r = fetch_engine.get(url, headers={'Accept': 'image/webp,image/avif,image/*;q=0.8'}, max_bytes=THUMB_MAX_BYTES)
+            if r.status != 200: raise FetchError(f"HTTP {r.status}")
+            path = thumb_cache.put(url, make_thumbnail(r.content))
+        except Exception: path = None
+        if path is None: thumb_cache.mark_failed(url)
+        metrics.inc('rssconnect_thumb_requests_total', result='miss' if path else 'failed')
+        return path
+
+_thumb_secret = None
+
+def thumb_signature(url):
+    # Not app.secret_key: that is a public default on most deployments, which would let anyone sign URLs.
+    global _thumb_secret
+    if _thumb_secret is None: _thumb_secret = os.environ.get('THUMB_SECRET') or get_secret('thumb_secret')
+    return hmac.new(_thumb_secret.encode('utf-8'), url.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+@app.template_filter('thumb')
+def thumb_url(url):
+    # Only URLs the app rendered itself are signed, so /thumb cannot be used as an open proxy.
+    if url and url.startswith('//'): url = 'https:' + url
+    if not url or url == LEGACY_PLACEHOLDER_IMG or not url.startswith(('http://', 'https://')):
+        return url_for('static', filename=PLACEHOLDER_IMG)
+    return url_for('thumb', u=url, s=thumb_signature(url))
+
+# --- Background Refresh ---
+class FeedRefresher:
+    """Keeps every subscribed feed warm with an adaptive, jittered schedule.
+
+    Feeds that change are polled more often, quiet ones back off towards
+    REFRESH_MAX_INTERVAL and failing ones back off exponentially. Only the
+    process holding REFRESH_LOCK_FILE refreshes (one per gunicorn deployment);
+    the others read its snapshots and retry the lock in case the holder exits.
+    """
+    def __init__(self, url_source, workers=REFRESH_WORKERS):
+        self.url_source = url_source
+        self.schedule = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='feed-refresh')
+        self._lock_file = None
+        self._synced_at = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def acquire_lock(self):
+        if self._lock_file is not None: return True
+        f = open(REFRESH_LOCK_FILE, 'a+')
+        try:
+            if fcntl is not None: fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                # Windows: lock the first byte; the lock is released when the process exits.
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    def jittered(self, delay):
+        return delay * random.uniform(1 - REFRESH_JITTER, 1 + REFRESH_JITTER)
+
+    def sync(self, now):
+        # Pick up feeds added or removed by any user and drop their orphaned snapshots.
+        urls = self.url_source()
+        for url in urls:
+            if url in self.schedule: continue
+            cached = load_snapshot(url)
+            due = cached['fetched_at'] + self.jittered(REFRESH_DEFAULT_INTERVAL) if cached else now
+            self.schedule[url] = {'interval': REFRESH_DEFAULT_INTERVAL, 'next_due': due, 'failures': 0}
+        for url in [u for u in self.schedule if u not in urls]: del self.schedule[url]
+        keep = {os.path.basename(snapshot_path(u)) for u in urls}
+        for name in os.listdir(SNAPSHOT_DIR):
+            if name.endswith('.json') and name not in keep:
+                try: os.remove(os.path.join(SNAPSHOT_DIR, name))
+                except OSError: pass
+        self._synced_at = now
+
+    def refresh_one(self, url):
+        with feed_cache.lock_for(url):
+            cached = load_snapshot(url)
+            entry, status = refresh_feed(url, cached)
+        newest = lambda e: e['articles'][0].link if e and e['articles'] else None
+        return status, status == 'updated' and newest(entry) != newest(cached)
+
+    def reschedule(self, url, status, changed, now):
+        state = self.schedule.get(url)
+        if state is None: return
+        if status in ('failed', 'open'):
+            state['failures'] += 1
+            delay = min(REFRESH_MAX_INTERVAL, state['interval'] * 2 ** state['failures'])
+        else:
+            state['failures'] = 0
+            if changed: state['interval'] = max(REFRESH_MIN_INTERVAL, state['interval'] / 2)
+            else: state['interval'] = min(REFRESH_MAX_INTERVAL, state['interval'] * 1.5)
+            delay = state['interval']
+        state['next_due'] = now + self.jittered(delay)
+
+    def refresh_due(self, now=None):
+        """Run one scheduling pass synchronously and return the URLs that were refreshed."""
+        now = now or time.time()
+        if now - self._synced_at >= REFRESH_SYNC_INTERVAL: self.sync(now)
+        due = [url for url, state in self.schedule.items() if state['next_due'] <= now]
+        for url, outcome in zip(due, self._executor.map(self.refresh_one, due)):
+            self.reschedule(url, *outcome, now=time.time())
+        return due
+
+    def run(self):
+        while not self._stop.is_set():
+            if not self.acquire_lock():
+                self._stop.wait(REFRESH_LOCK_RETRY)
+                continue
+            try: self.refresh_due()
+            except Exception: app.logger.exception("Feed refresh pass failed")
+            next_due = min((s['next_due'] for s in self.schedule.values()), default=time.time() + REFRESH_SYNC_INTERVAL)
+            self._stop.wait(max(1, min(next_due - time.time(), REFRESH_SYNC_INTERVAL)))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='feed-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None: self._thread.join()
+        self._thread = None
+        self._stop.clear()
+
+refresher = FeedRefresher(all_feed_urls)
+if REFRESHER_ENABLED: refresher.start()
+elif os.environ.get('FEED_REFRESHER', '1') != '0':
+    app.logger.warning("No file locking available (fcntl/msvcrt); background refresh is disabled and feeds are fetched on request.")
+
+@app.template_filter('age')
+def format_age(ts):
+    if not ts: return 'never'
+    seconds = max(0, int(time.time() - ts))
+    if seconds < 60: return 'just now'
+    if seconds < 3600: return f"{seconds // 60} min ago"
+    if seconds < 86400: return f"{seconds // 3600} hr ago"
+    return f"{seconds // 86400} days ago"
 
 # --- Routes ---
 
@@ -148,8 +1314,7 @@ def index():
         return redirect(url_for('accounts'))
     
     # Check if user actually exists in data
-    all_data = get_all_data()
-    if session['user'] not in all_data:
+    if not user_exists(session['user']):
         session.clear()
         return redirect(url_for('accounts'))
         
@@ -157,42 +1322,36 @@ def index():
 
 @app.route('/accounts', methods=['GET', 'POST'])
 def accounts():
-    all_data = get_all_data()
-    if not all_data:
-        default_user = "Default User"
-        all_data[default_user] = {'categories': list(DEFAULT_CATEGORIES), 'feeds': list(DEFAULT_FEEDS), 'favorites': [], 'fav_categories': ['Read Later']}
-        save_all_data(all_data)
-        
+    if not list_users():
+        create_user("Default User")
+    
     if request.method == 'POST':
         action = request.form.get('action')
         if action == 'create':
             username = request.form.get('username')
-            if username and username not in all_data:
-                all_data[username] = {'categories': list(DEFAULT_CATEGORIES), 'feeds': list(DEFAULT_FEEDS)}
-                save_all_data(all_data)
+            if username and create_user(username):
                 session['user'] = username
                 return redirect(url_for('home'))
             else: flash("User already exists.", "error")
         elif action == 'login':
             username = request.form.get('username')
-            if username in all_data:
+            if user_exists(username):
                 session['user'] = username
                 return redirect(url_for('home'))
         elif action == 'delete':
             username = request.form.get('username')
-            if username in all_data:
-                del all_data[username]
-                save_all_data(all_data)
+            if user_exists(username):
+                delete_user(username)
                 if session.get('user') == username: session.pop('user', None)
             return redirect(url_for('accounts'))
             
     # Render INDEX.HTML (Accounts)
-    return render_template('index.html', users=list(all_data.keys()))
+    return render_template('index.html', users=list_users())
 
 @app.route('/home')
 def home():
     if 'user' not in session: return redirect(url_for('accounts'))
-    user_data, _ = get_user_config(session['user'])
+    user_data = get_user_config(session['user'])
     # Render PAGE1.HTML (Home)
     return render_template('page1.html', categories=user_data['categories'])
 
@@ -204,37 +1363,86 @@ def logout():
 @app.route('/category/<path:category_name>')
 def show_category(category_name):
     if 'user' not in session: return redirect(url_for('accounts'))
-    user_data, _ = get_user_config(session['user'])
-    target_feeds = [f for f in user_data['feeds'] if f['category'] == category_name]
-    articles = []
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        results = executor.map(fetch_single_feed, target_feeds)
-        for res in results: articles.extend(res)
-    articles.sort(key=lambda x: x['timestamp'], reverse=True)
-    # Render PAGE2.HTML (Articles)
-    return render_template('page2.html', category=category_name, articles=articles, feed_count=len(target_feeds), fav_categories=user_data['fav_categories'])
+    return render_timeline(category_name, get_feeds(session['user'], category_name), url_for('api_category', category_name=category_name))
+
+@app.route('/timeline')
+def all_categories():
+    if 'user' not in session: return redirect(url_for('accounts'))
+    return render_timeline('All Categories', unique_feeds(get_feeds(session['user'])), url_for('api_timeline'))
+
+def render_timeline(title, target_feeds, api_url):
+    progress = {'articles': 0, 'pending': len(target_feeds), 'updated_at': None, 'cursor': None}
+
+    def batches():
+        # One batch per feed as it arrives, trimmed to what can still make the first page;
+        # the page slots each card in by timestamp and drops any that fall off the end.
+        top = []
+        for res in fetch_engine.iter_until(fetch_single_feed, target_feeds, CATEGORY_DEADLINE):
+            progress['pending'] -= 1
+            progress['articles'] += len(res)
+            batch = []
+            for a in sorted(res, key=timeline_key):
+                if len(top) == TIMELINE_PAGE_SIZE and timeline_key(a) >= top[-1][0]: break
+                bisect.insort(top, (timeline_key(a), a))
+                del top[TIMELINE_PAGE_SIZE:]
+                batch.append(a)
+            if batch: yield batch
+        if progress['articles'] > TIMELINE_PAGE_SIZE: progress['cursor'] = encode_cursor(top[-1][1])
+        progress['updated_at'] = snapshot_updated_at([f['url'] for f in target_feeds])
+
+    # Flashes are popped now: a streamed body is rendered after the session cookie has been sent.
+    context = dict(category=title, feed_count=len(target_feeds), progress=progress, api_url=api_url, page_size=TIMELINE_PAGE_SIZE, fav_categories=get_fav_categories(session['user']),
+                   flashed_messages=get_flashed_messages(with_categories=True))
+    # Render PAGE2.HTML (Articles); ?stream=0 renders the first page at once.
+    if request.args.get('stream') == '0':
+        articles = [a for batch in batches() for a in batch]
+        articles.sort(key=timeline_key)
+        return render_template('page2.html', batches=[articles[:TIMELINE_PAGE_SIZE]] if articles else [], **context)
+    response = app.response_class(stream_template('page2.html', batches=batches(), **context))
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/category/<path:category_name>')
+def api_category(category_name):
+    if 'user' not in session: return jsonify(error='Not logged in.'), 401
+    return timeline_page(get_feeds(session['user'], category_name))
+
+@app.route('/api/timeline')
+def api_timeline():
+    if 'user' not in session: return jsonify(error='Not logged in.'), 401
+    return timeline_page(unique_feeds(get_feeds(session['user'])))
+
+def timeline_page(target_feeds):
+    """JSON page of the merged timeline: `?cursor=` continues a previous page, `?limit=` sets
+    the page size and `?html=1` adds the rendered cards for page2.html."""
+    try:
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        limit = max(1, min(int(request.args.get('limit', TIMELINE_PAGE_SIZE)), 100))
+    except ValueError as e: return jsonify(error=str(e)), 400
+    streams = list(fetch_engine.iter_until(fetch_single_feed, target_feeds, CATEGORY_DEADLINE))
+    page, next_cursor = merge_timeline(streams, after, limit)
+    body = {'articles': [a._asdict() for a in page], 'next_cursor': next_cursor, 'pending': len(target_feeds) - len(streams)}
+    if request.args.get('html') == '1':
+        card = get_template_attribute('cards.html', 'article_card')
+        fav_categories = get_fav_categories(session['user'])
+        body['html'] = ''.join(str(card(a, fav_categories)) for a in page)
+    return jsonify(body)
 
 @app.route('/favorites', methods=['GET', 'POST'])
 def favorites():
     if 'user' not in session: return redirect(url_for('accounts'))
     username = session['user']
-    user_data, all_data = get_user_config(username)
     if request.method == 'POST':
         action = request.form.get('action')
         if action == 'add_fav_cat':
             name = request.form.get('cat_name')
-            if name and name not in user_data['fav_categories']: user_data['fav_categories'].append(name)
+            if name: add_fav_category(username, name)
         elif action == 'del_fav_cat':
-            name = request.form.get('cat_name')
-            if name in user_data['fav_categories']:
-                user_data['fav_categories'].remove(name)
-                user_data['favorites'] = [f for f in user_data['favorites'] if f['fav_category'] != name]
+            delete_fav_category(username, request.form.get('cat_name'))
         elif action == 'delete_article':
-            link = request.form.get('article_link')
-            user_data['favorites'] = [f for f in user_data['favorites'] if f['link'] != link]
-        all_data[username] = user_data
-        save_all_data(all_data)
+            delete_favorite(username, request.form.get('article_link'))
         return redirect(url_for('favorites'))
+    user_data = get_user_config(username)
     # Render PAGE3.HTML (Favorites)
     return render_template('page3.html', favorites=user_data['favorites'], fav_categories=user_data['fav_categories'])
 
@@ -242,16 +1450,12 @@ def favorites():
 def save_article():
     if 'user' not in session: return redirect(url_for('accounts'))
     username = session['user']
-    user_data, all_data = get_user_config(username)
     new_fav = {
         'title': request.form.get('title'), 'link': request.form.get('link'),
         'thumbnail': request.form.get('thumbnail'), 'source': request.form.get('source'),
         'timestamp': time.time(), 'fav_category': request.form.get('fav_category')
     }
-    if not any(f['link'] == new_fav['link'] for f in user_data['favorites']):
-        user_data['favorites'].insert(0, new_fav)
-        all_data[username] = user_data
-        save_all_data(all_data)
+    if new_fav['link'] and add_favorite(username, new_fav):
         flash("Article Saved!", "success")
     return redirect(request.referrer)
 
@@ -259,66 +1463,134 @@ def save_article():
 def dashboard():
     if 'user' not in session: return redirect(url_for('accounts'))
     username = session['user']
-    user_data, all_data = get_user_config(username)
     if request.method == 'POST':
         action = request.form.get('action')
         if action == 'add_page':
             name = request.form.get('page_name')
-            if len(user_data['categories']) < LIMIT_CATEGORIES and name not in user_data['categories']: user_data['categories'].append(name)
+            if name: add_category(username, name)
         elif action == 'delete_page':
-            name = request.form.get('page_name')
-            if name in user_data['categories']: user_data['categories'].remove(name)
+            delete_category(username, request.form.get('page_name'))
         elif action == 'add_feed':
-            cat = request.form.get('category')
-            if len([f for f in user_data['feeds'] if f['category'] == cat]) < LIMIT_FEEDS_PER_CAT:
-                user_data['feeds'].append({'id': str(int(time.time())), 'name': request.form.get('name'), 'url': request.form.get('url'), 'category': cat})
+            add_feed(username, request.form.get('name'), request.form.get('url'), request.form.get('category'))
         elif action == 'delete_feed':
-            user_data['feeds'] = [f for f in user_data['feeds'] if f['id'] != request.form.get('feed_id')]
+            delete_feeds(username, feed_id=request.form.get('feed_id'))
         elif action == 'delete_category_feeds':
-            user_data['feeds'] = [f for f in user_data['feeds'] if f['category'] != request.form.get('category')]
+            delete_feeds(username, category=request.form.get('category'))
         elif action == 'delete_all_feeds':
-            user_data['feeds'] = []
-        all_data[username] = user_data
-        save_all_data(all_data)
+            delete_feeds(username)
         return redirect(url_for('dashboard'))
+    user_data = get_user_config(username)
     # Render PAGE4.HTML (Manager)
-    return render_template('page4.html', categories=user_data['categories'], feeds=user_data['feeds'])
+    unhealthy = feed_breaker.unhealthy({f['url'] for f in user_data['feeds']})
+    return render_template('page4.html', categories=user_data['categories'], feeds=user_data['feeds'], unhealthy=unhealthy)
+
+@app.route('/opml/export')
+def export_opml():
+    if 'user' not in session: return redirect(url_for('accounts'))
+    return app.response_class(build_opml(session['user']), mimetype='text/x-opml', headers={'Content-Disposition': 'attachment; filename=rssconnect.opml'})
+
+@app.route('/opml/import', methods=['POST'])
+def import_opml():
+    if 'user' not in session: return redirect(url_for('accounts'))
+    username = session['user']
+    upload = request.files.get('opml')
+    if not upload or not upload.filename:
+        flash("Choose an OPML file to import.", "error")
+        return redirect(url_for('dashboard'))
+    try: candidates = parse_opml(upload.stream)
+    except ET.ParseError:
+        flash("That file is not valid OPML.", "error")
+        return redirect(url_for('dashboard'))
+    existing, todo = {f['url'] for f in get_feeds(username)}, []
+    for feed in candidates:
+        if feed[3] not in existing:
+            existing.add(feed[3])
+            todo.append(feed)
+    result = {'total': len(candidates), 'checked': len(todo), 'duplicates': len(candidates) - len(todo), 'invalid': [], 'added': 0, 'skipped': 0}
+    # The job outlives this request so closing the tab or a worker timeout cannot discard it;
+    # its own thread drives validation on the shared fetch pool without holding a pool slot.
+    job_id = create_import(username, result)
+    threading.Thread(target=run_opml_import, args=(job_id, username, todo, result), name='opml-import', daemon=True).start()
+    return redirect(url_for('opml_import_status', job_id=job_id))
+
+@app.route('/opml/import/<job_id>')
+def opml_import_status(job_id):
+    if 'user' not in session: return redirect(url_for('accounts'))
+    job = get_import(session['user'], job_id)
+    if job is None:
+        flash("That import no longer exists.", "error")
+        return redirect(url_for('dashboard'))
+    # Render PAGE9.HTML (OPML Import)
+    return render_template('page9.html', job=job, result=job['result'], api_url=url_for('api_opml_import', job_id=job_id), config_limits={'categories': LIMIT_CATEGORIES, 'feeds': LIMIT_FEEDS_PER_CAT})
+
+@app.route('/api/opml/import/<job_id>')
+def api_opml_import(job_id):
+    if 'user' not in session: return jsonify(error='Not logged in.'), 401
+    job = get_import(session['user'], job_id)
+    if job is None: return jsonify(error='Unknown import.'), 404
+    return jsonify(done=job['done'], checked=job['result']['checked'], finished=job['finished'], stalled=job['stalled'])
 
 @app.route('/finder', methods=['GET', 'POST'])
 def finder():
     if 'user' not in session: return redirect(url_for('accounts'))
     username = session['user']
-    user_data, all_data = get_user_config(username)
     found_feeds = []
     error = None
     url = ""
     if request.method == 'POST':
         if request.form.get('action') == 'save_feed':
-            user_data['feeds'].append({'id': str(int(time.time())), 'name': request.form.get('feed_name'), 'url': request.form.get('feed_url'), 'category': request.form.get('category')})
-            all_data[username] = user_data
-            save_all_data(all_data)
-            flash(f"Saved {request.form.get('feed_name')}!", "success")
+            if add_feed(username, request.form.get('feed_name'), request.form.get('feed_url'), request.form.get('category')): flash(f"Saved {request.form.get('feed_name')}!", "success")
+            else: flash(f"{request.form.get('category')} already has {LIMIT_FEEDS_PER_CAT} feeds.", "error")
         url_input = request.form.get('website_url')
         if url_input:
             url = url_input if url_input.startswith('http') else 'https://' + url_input
-            try:
-                response = requests.get(url, timeout=5)
-                soup = BeautifulSoup(response.content, 'html.parser')
-                links = soup.find_all('link', type=['application/rss+xml', 'application/atom+xml'])
-                for link in links: found_feeds.append({'title': link.get('title', 'RSS Feed'), 'url': urljoin(url, link.get('href'))})
-                if len(found_feeds) < FINDER_RESULT_LIMIT:
-                    for a in soup.find_all('a', href=True):
-                        href = a['href'].lower()
-                        if 'rss' in href or 'feed' in href or '.xml' in href: found_feeds.append({'title': a.get_text().strip() or "Feed", 'url': urljoin(url, a['href'])})
-                seen = set()
-                unique_feeds = []
-                for f in found_feeds:
-                    if f['url'] not in seen: seen.add(f['url']); unique_feeds.append(f)
-                found_feeds = unique_feeds[:FINDER_RESULT_LIMIT]
-                if not found_feeds: error = "No RSS feeds found."
-            except: error = "Could not connect."
+            found_feeds, error = discover_feeds(url)
     # Render PAGE5.HTML (Finder)
-    return render_template('page5.html', found_feeds=found_feeds, search_url=url, error=error, categories=user_data['categories'])
+    return render_template('page5.html', found_feeds=found_feeds, search_url=url, error=error, categories=get_user_config(username)['categories'])
+
+@app.route('/search')
+def search():
+    if 'user' not in session: return redirect(url_for('accounts'))
+    query = request.args.get('q', '').strip()
+    days = request.args.get('days', type=int)
+    results = search_articles(session['user'], query, days) if query else []
+    # Render PAGE8.HTML (Search)
+    return render_template('page8.html', query=query, days=days, results=results, fav_categories=get_fav_categories(session['user']))
+
+@app.route('/api/search')
+def api_search():
+    if 'user' not in session: return jsonify(error='Not logged in.'), 401
+    query = request.args.get('q', '').strip()
+    if not query: return jsonify(error='Missing q.'), 400
+    limit = max(1, min(request.args.get('limit', SEARCH_RESULT_LIMIT, type=int), 200))
+    results = search_articles(session['user'], query, request.args.get('days', type=int), limit)
+    return jsonify(query=query, articles=[a._asdict() for a in results])
+
+@app.route('/thumb')
+def thumb():
+    if 'user' not in session: return "Not logged in.", 401
+    url = request.args.get('u', '')
+    if not hmac.compare_digest(request.args.get('s', ''), thumb_signature(url)): return "Invalid thumbnail link.", 403
+    path = thumb_cache.get(url)
+    if path: metrics.inc('rssconnect_thumb_requests_total', result='hit')
+    else: path = fetch_thumbnail(url)
+    if path is None:
+        response = redirect(url_for('static', filename=PLACEHOLDER_IMG))
+        response.cache_control.max_age = THUMB_FAIL_TTL
+        return response
+    response = send_file(path, mimetype='image/webp', max_age=THUMB_MAX_AGE, etag=os.path.basename(path)[:-5])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Per-feed series list every user's subscriptions: require METRICS_TOKEN, or a direct local scrape without one.
+    if METRICS_TOKEN: allowed = hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}")
+    else: allowed = request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+    if not allowed: return "Forbidden.", 403
+    metrics.set('rssconnect_feed_cache_entries', len(feed_cache))
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/help')
 def help_page(): 
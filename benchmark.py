@@ -0,0 +1,258 @@
+"""Offline benchmark suite for RSSConnect.
+
+Starts a local synthetic feed server and runs the app's hot paths against it
+through Flask's test client, printing machine-readable JSON:
+
+    python benchmark.py                          # all scenarios
+    python benchmark.py -s category fetch -o bench.json
+    python benchmark.py --serve                  # just run the feed server
+
+Feed URLs look like /feed/<kind>/<name>.xml?entries=20&html_kb=4&latency_ms=50&error_rate=0.1
+where kind is rss, atom or youtube; /site/<name>/ serves an HTML page that
+links to a feed for the Finder. Every response carries an ETag and answers
+If-None-Match with 304.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+LOREM = ('Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt '
+         'ut labore et dolore magna aliqua Ut enim ad minim veniam quis nostrud exercitation').split()
+
+# --- Synthetic Feed Server ---
+def html_blob(rng, size_kb):
+    # Publisher-style markup: nested tags, inline styles, scripts and images.
+    parts, size = [], 0
+    while size < size_kb * 1024:
+        words = ' '.join(rng.choice(LOREM) for _ in range(40))
+        chunk = (f'<div class="post" style="margin:0"><p><strong>{words[:60]}</strong> {words}</p>'
+                 f'<script>track({rng.randint(0, 10**6)})</script><img src="https://img.example/{rng.randint(0, 10**6)}.jpg" width="640">'
+                 f'<ul><li><a href="https://example.com/{rng.randint(0, 10**6)}">{words[:30]}</a></li></ul></div>')
+        parts.append(chunk)
+        size += len(chunk)
+    return ''.join(parts)
+
+def esc(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def build_feed(kind, name, entries, html_kb, seed):
+    rng = random.Random(f"{kind}/{name}/{seed}")
+    now = 1_700_000_000
+    items = []
+    for i in range(entries):
+        ts = now - i * 3600 - rng.randint(0, 1800)
+        title, link = f"{name} story {i}: {' '.join(rng.choice(LOREM) for _ in range(6))}", f"https://example.com/{name}/{i}"
+        body = esc(html_blob(rng, html_kb)) if html_kb else esc(' '.join(rng.choice(LOREM) for _ in range(30)))
+        if kind == 'rss':
+            items.append(f"<item><title>{esc(title)}</title><link>{link}</link><guid>{link}</guid><pubDate>{formatdate(ts, usegmt=True)}</pubDate><description>{body}</description></item>")
+        else:
+            stamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(ts))
+            media = (f'<yt:videoId>{name}{i}</yt:videoId><media:group><media:title>{esc(title)}</media:title>'
+                     f'<media:thumbnail url="https://i.ytimg.example/{name}{i}/hqdefault.jpg" width="480" height="360"/>'
+                     f'<media:description>{body}</media:description></media:group>') if kind == 'youtube' else f'<summary type="html">{body}</summary>'
+            items.append(f'<entry><id>{link}</id><title>{esc(title)}</title><link rel="alternate" href="{link}"/><published>{stamp}</published><updated>{stamp}</updated>{media}</entry>')
+    if kind == 'rss':
+        return f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>{name}</title><link>https://example.com/{name}</link>{"".join(items)}</channel></rss>'
+    return ('<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom" xmlns:yt="http://www.youtube.com/xml/schemas/2015" '
+            f'xmlns:media="http://search.yahoo.com/mrss/"><title>{name}</title>{"".join(items)}</feed>')
+
+class FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    cache = {}
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if etag: self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        q = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        time.sleep(int(q.get('latency_ms', 0)) / 1000)
+        if random.random() < float(q.get('error_rate', 0)): return self.send_body(500, b'synthetic error', 'text/plain')
+        segments = parts.path.strip('/').split('/')
+        if segments[0] == 'feed' and len(segments) == 3 and segments[1] in ('rss', 'atom', 'youtube'):
+            key = (segments[1], segments[2], int(q.get('entries', 20)), float(q.get('html_kb', 0)), q.get('seed', '0'))
+            if key not in self.cache:
+                body = build_feed(key[0], key[1].removesuffix('.xml'), key[2], key[3], key[4]).encode('utf-8')
+                self.cache[key] = (body, '"%s"' % hashlib.sha1(body).hexdigest()[:16])
+            body, etag = self.cache[key]
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                return self.end_headers()
+            return self.send_body(200, body, 'application/atom+xml' if key[0] != 'rss' else 'application/rss+xml', etag)
+        if segments[0] == 'site' and len(segments) >= 2:
+            name = segments[1]
+            if segments[2:] == ['feed']: return self.send_body(200, build_feed('rss', name, 5, 0, '0').encode('utf-8'), 'application/rss+xml')
+            page = (f'<html><head><title>{name}</title><link rel="alternate" type="application/rss+xml" title="{name} RSS" href="/feed/rss/{name}.xml">'
+                    f'</head><body>{html_blob(random.Random(name), 200)}</body></html>')
+            return self.send_body(200, page.encode('utf-8'), 'text/html; charset=utf-8')
+        self.send_body(404, b'not found', 'text/plain')
+
+class FeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Discovery hangs up once it has read enough; that is expected, not an error.
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)): super().handle_error(request, client_address)
+
+def start_server(port=0):
+    server = FeedServer(('127.0.0.1', port), FeedHandler)
+    threading.Thread(target=server.serve_forever, name='feed-server', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# --- Scenarios ---
+def summarize(samples):
+    samples = sorted(samples)
+    if not samples: return {}
+    pick = lambda p: samples[min(len(samples) - 1, int(round(p * (len(samples) - 1))))]
+    return {'n': len(samples), 'mean_ms': statistics.fmean(samples) * 1e3, 'p50_ms': pick(0.5) * 1e3, 'p95_ms': pick(0.95) * 1e3, 'max_ms': samples[-1] * 1e3}
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+def feed_urls(base, args, prefix):
+    kinds = ('rss', 'atom', 'youtube')
+    return [f"{base}/feed/{kinds[i % 3]}/{prefix}{i}.xml?entries={args.entries}&html_kb={args.html_kb}&latency_ms={args.latency_ms}&error_rate={args.error_rate}"
+            for i in range(args.feeds)]
+
+def reset_feeds(app):
+    app.feed_cache.clear()
+    app._normalized.clear()
+    for name in os.listdir(app.SNAPSHOT_DIR): os.remove(os.path.join(app.SNAPSHOT_DIR, name))
+    with app.transaction() as conn: conn.execute('DELETE FROM feed_health')
+
+def logged_in(app, username):
+    client = app.app.test_client()
+    with client.session_transaction() as s: s['user'] = username
+    return client
+
+def bench_category(app, base, args):
+    """/category/<name> latency, cold (empty caches) vs warm, streamed and with ?stream=0."""
+    app.create_user('bench')
+    app.add_category('bench', 'Bench')
+    app.import_feeds('bench', [('Bench', f"Feed {i}", url) for i, url in enumerate(feed_urls(base, args, 'cat'))])
+    client, result = logged_in(app, 'bench'), {}
+    for mode, path in (('streamed', '/category/Bench'), ('buffered', '/category/Bench?stream=0')):
+        cold = []
+        for _ in range(args.repeat):
+            reset_feeds(app)
+            cold.append(timed(lambda: client.get(path).get_data()))
+        warm = [timed(lambda: client.get(path).get_data()) for _ in range(args.repeat)]
+        result[mode] = {'cold': summarize(cold), 'warm': summarize(warm)}
+    return result
+
+def bench_fetch(app, base, args):
+    """fetch_single_feed throughput over distinct feeds: cold downloads and 304 revalidations."""
+    feeds = [{'name': f"Feed {i}", 'url': url} for i, url in enumerate(feed_urls(base, args, 'fetch'))]
+    reset_feeds(app)
+    run = lambda: list(app.fetch_engine.iter_until(app.fetch_single_feed, feeds, 600))
+    cold = timed(run)
+    app.feed_cache.ttl, ttl = 0, app.feed_cache.ttl
+    try: revalidate = timed(run)
+    finally: app.feed_cache.ttl = ttl
+    cached = timed(run)
+    return {name: {'seconds': t, 'feeds_per_s': len(feeds) / t} for name, t in (('cold', cold), ('revalidate_304', revalidate), ('cached', cached))}
+
+def bench_finder(app, base, args):
+    """/finder discovery latency on fresh sites and on repeated (cached) lookups."""
+    app.create_user('finder')
+    client = logged_in(app, 'finder')
+    cold = [timed(lambda i=i: client.post('/finder', data={'website_url': f"{base}/site/s{i}-{time.time_ns()}/"}).get_data()) for i in range(args.repeat)]
+    warm = [timed(lambda: client.post('/finder', data={'website_url': f"{base}/site/repeat/"}).get_data()) for _ in range(args.repeat + 1)][1:]
+    return {'cold': summarize(cold), 'cached': summarize(warm)}
+
+def bench_store(app, base, args):
+    """Concurrent writers on the user store: every simulated user saves articles and edits feeds."""
+    names = [f"user{i}" for i in range(args.users)]
+    for name in names: app.create_user(name)
+
+    def session(name):
+        client, samples, errors = logged_in(app, name), [], 0
+        for i in range(args.ops):
+            if i % 2 == 0: call = lambda: client.post('/save_article', data={'title': f"t{i}", 'link': f"https://example.com/{name}/{i}", 'thumbnail': '', 'source': 'bench', 'fav_category': 'Read Later'}, headers={'Referer': '/favorites'})
+            else: call = lambda: client.post('/manager', data={'action': 'add_feed', 'name': f"f{i}", 'url': f"https://example.com/{name}/{i}.xml", 'category': 'Other'})
+            started = time.perf_counter()
+            status = call().status_code
+            samples.append(time.perf_counter() - started)
+            errors += status >= 400
+        return samples, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool: results = list(pool.map(session, names))
+    elapsed = time.perf_counter() - started
+    samples = [s for r in results for s in r[0]]
+    return {'users': args.users, 'ops': len(samples), 'errors': sum(r[1] for r in results), 'ops_per_s': len(samples) / elapsed, 'latency': summarize(samples)}
+
+SCENARIOS = {'category': bench_category, 'fetch': bench_fetch, 'finder': bench_finder, 'store': bench_store}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-s', '--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('-o', '--output', help='write JSON here instead of stdout')
+    parser.add_argument('--feeds', type=int, default=30, help='feeds per category / fetch run')
+    parser.add_argument('--entries', type=int, default=20)
+    parser.add_argument('--html-kb', type=float, default=4, help='HTML per entry summary')
+    parser.add_argument('--latency-ms', type=int, default=50)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--users', type=int, default=16, help='concurrent users for the store scenario')
+    parser.add_argument('--ops', type=int, default=50, help='writes per user for the store scenario')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--serve', action='store_true', help='only run the synthetic feed server')
+    parser.add_argument('--port', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server, base = start_server(args.port)
+    if args.serve:
+        print(f"Serving synthetic feeds at {base} (Ctrl+C to stop)", file=sys.stderr)
+        try: threading.Event().wait()
+        except KeyboardInterrupt: return
+
+    # Point the app at a throwaway data directory before importing it.
+    workdir = tempfile.mkdtemp(prefix='rssconnect-bench-')
+    os.environ.update({'RSSCONNECT_DATA_DIR': workdir, 'FEED_REFRESHER': '0', 'CATEGORY_DEADLINE': '60'})
+    os.environ.pop('RSSCONNECT_DB', None)
+    import app
+
+    try: commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError: commit = None
+    report = {'meta': {'timestamp': time.time(), 'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+                       'config': {k: v for k, v in vars(args).items() if k not in ('output', 'serve', 'port', 'scenarios')}},
+              'scenarios': {}}
+    for name in args.scenarios:
+        print(f"running {name}...", file=sys.stderr)
+        report['scenarios'][name] = SCENARIOS[name](app, base, args)
+    server.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f: f.write(out + '\n')
+    else: print(out)
+
+if __name__ == '__main__':
+    main()